@@ -5,25 +5,93 @@ import datetime
 import fitz
 import re
 import argparse
-import nltk
-from nltk.tokenize import sent_tokenize
-from nltk.corpus import stopwords
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.feature_extraction.text import CountVectorizer
 from collections import Counter
 
 try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
+    import orjson
+except ImportError:
+    orjson = None
+
+# NLTK's English stopword list, embedded to avoid the corpus download at runtime
+_ENGLISH_STOPWORDS = frozenset([
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're", "you've",
+    "you'll", "you'd", 'your', 'yours', 'yourself', 'yourselves', 'he', 'him', 'his', 'himself',
+    'she', "she's", 'her', 'hers', 'herself', 'it', "it's", 'its', 'itself', 'they', 'them',
+    'their', 'theirs', 'themselves', 'what', 'which', 'who', 'whom', 'this', 'that', "that'll",
+    'these', 'those', 'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has',
+    'had', 'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or',
+    'because', 'as', 'until', 'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against',
+    'between', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'to', 'from',
+    'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again', 'further', 'then', 'once',
+    'here', 'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more',
+    'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than',
+    'too', 'very', 's', 't', 'can', 'will', 'just', 'don', "don't", 'should', "should've", 'now',
+    'd', 'll', 'm', 'o', 're', 've', 'y', 'ain', 'aren', "aren't", 'couldn', "couldn't", 'didn',
+    "didn't", 'doesn', "doesn't", 'hadn', "hadn't", 'hasn', "hasn't", 'haven', "haven't", 'isn',
+    "isn't", 'ma', 'mightn', "mightn't", 'mustn', "mustn't", 'needn', "needn't", 'shan', "shan't",
+    'shouldn', "shouldn't", 'wasn', "wasn't", 'weren', "weren't", 'won', "won't", 'wouldn',
+    "wouldn't"
+])
+
+_STOPWORDS = _ENGLISH_STOPWORDS | {'may', 'also', 'many', 'would', 'could', 'one', 'two', 'three', 'four'}
+
+_PAGE_CHUNK_SIZE = 5
+_MIN_HEADING_LINES = 3
+_MAX_TITLE_WORDS = 12
+
+_WORD_RE = re.compile(r'\b\w+\b')
+_SENT_RE = re.compile(r'(?<=[.!?])\s+')
+_INFO_RE = re.compile(r'\b(important|key|significant|essential|must|should|recommend|popular|best|top|famous)\b', re.IGNORECASE)
+
+def _page_lines(page):
+    """
+    Read the text lines of a page together with their font information.
+    
+    Args:
+        page (fitz.Page): Page to read
+        
+    Returns:
+        list: (text, font_size, is_bold, block_num) tuple for each line, with empty text for blank lines
+    """
+    lines = []
+    for block_num, block in enumerate(page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]):
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                lines.append(("", 0.0, False, block_num))
+                continue
+            
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            font_size = max(span["size"] for span in spans)
+            is_bold = all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans)
+            lines.append((text, font_size, is_bold, block_num))
+    
+    return lines
+
+def _extract_page_lines(pdf_path, start, stop):
+    """
+    Extract the lines of a range of pages from a PDF. Runs inside a worker process.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        start (int): Index of the first page to extract
+        stop (int): Index one past the last page to extract
+        
+    Returns:
+        list: Lines of each page in the range, as returned by _page_lines
+    """
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        return [_page_lines(doc[page_num]) for page_num in range(start, stop)]
 
 class DocumentAnalyst:
     def __init__(self):
         """
         Initialize the Document Analyst with a robust, universal approach
         """
-        self.stopwords = set(stopwords.words('english'))
-        self.stopwords.update(['may', 'also', 'many', 'would', 'could', 'one', 'two', 'three', 'four'])
+        self.stopwords = _STOPWORDS
         print("Universal document analyzer initialized")
         
     def extract_sections_from_pdf(self, pdf_path):
@@ -36,74 +104,100 @@ class DocumentAnalyst:
         Returns:
             list: List of dictionaries containing section information
         """
-        sections = []
-        
         try:
-            doc = fitz.open(pdf_path)
+            with fitz.open(pdf_path, filetype="pdf") as doc:
+                page_lines = [_page_lines(page) for page in doc]
+        except Exception as e:
+            print(f"Error processing {pdf_path}: {e}")
+            return []
+        
+        return self.extract_sections_from_lines(page_lines)
+    
+    def extract_sections_from_lines(self, page_lines):
+        """
+        Extract sections and their content from the lines of a document.
+        
+        Titles are lines set in bold or in a font clearly larger than the body text, with
+        wrapped heading lines joined into one title. Documents with fewer than
+        _MIN_HEADING_LINES such lines fall back to casing and layout heuristics.
+        
+        Args:
+            page_lines (list): Lines of each page in document order, as returned by _page_lines
             
-            potential_titles = []
-            for page_num, page in enumerate(doc):
-                text = page.get_text()
-                lines = text.split('\n')
+        Returns:
+            list: List of dictionaries containing section information
+        """
+        sections = []
+        
+        font_sizes = [font_size for lines in page_lines for line, font_size, _, _ in lines if line]
+        if not font_sizes:
+            return sections
+        
+        heading_size = np.median(font_sizes) + 2
+        heading_count = sum(1 for lines in page_lines for line, font_size, is_bold, _ in lines
+                            if line and (is_bold or font_size > heading_size))
+        is_styled = heading_count >= _MIN_HEADING_LINES
+        
+        potential_titles = []
+        for page_num, lines in enumerate(page_lines):
+            end = -1
+            for i, (line, font_size, is_bold, block_num) in enumerate(lines):
+                if i <= end or not line or line[-1] == '.' or not line[0].isupper():
+                    continue
                 
-                for i, line in enumerate(lines):
-                    line = line.strip()
-                    if not line:
+                if is_styled:
+                    if not (is_bold or font_size > heading_size):
                         continue
                     
-                    is_isolated = (i == 0 or not lines[i-1].strip()) and (i == len(lines)-1 or not lines[i+1].strip())
-                    is_potential_title = (
-                        line[0].isupper() and 
-                        len(line.split()) <= 8 and 
-                        not line.endswith('.') and
-                        (is_isolated or line.isupper() or all(word[0].isupper() for word in line.split()))
-                    )
+                    # A wrapped heading continues on lines of the same style that start in
+                    # lowercase, or that share its block unless they are a label such as "Ingredients:"
+                    end = i
+                    while end + 1 < len(lines):
+                        next_line, next_size, next_bold, next_block = lines[end + 1]
+                        if not next_line or next_size != font_size or next_bold != is_bold:
+                            break
+                        if not next_line[0].islower() and (next_block != block_num or next_line[-1] == ':'):
+                            break
+                        end += 1
                     
-                    if is_potential_title:
-                        potential_titles.append((line, page_num))
-            
-            for i, (title, page_num) in enumerate(potential_titles):
-                content = []
-                current_page = page_num
-                next_title_page = potential_titles[i+1][1] if i < len(potential_titles)-1 else None
-                next_title = potential_titles[i+1][0] if i < len(potential_titles)-1 else None
-                
-                page_text = doc[current_page].get_text()
-                lines = page_text.split('\n')
-                
-                title_found = False
-                for j, line in enumerate(lines):
-                    if line.strip() == title:
-                        title_found = True
+                    title = " ".join(heading[0] for heading in lines[i:end + 1])
+                    if title[-1] == '.' or len(title.split()) > _MAX_TITLE_WORDS:
+                        continue
+                else:
+                    words = line.split()
+                    if len(words) > 8:
                         continue
                     
-                    if title_found:
-                        if next_title and line.strip() == next_title and current_page == next_title_page:
-                            break
-                        content.append(line.strip())
-                
-                if next_title_page is not None and next_title_page > current_page:
-                    for p in range(current_page + 1, next_title_page + 1):
-                        page_text = doc[p].get_text()
-                        lines = page_text.split('\n')
-                        
-                        for line in lines:
-                            if p == next_title_page and line.strip() == next_title:
-                                break
-                            content.append(line.strip())
+                    is_isolated = (i == 0 or not lines[i-1][0]) and (i == len(lines)-1 or not lines[i+1][0])
+                    if not (is_isolated or line.isupper() or all(word[0].isupper() for word in words)):
+                        continue
+                    
+                    end = i
+                    title = line
                 
-                if content:
-                    sections.append({
-                        "title": title,
-                        "content": " ".join([c for c in content if c]),
-                        "page_number": page_num + 1
-                    })
+                potential_titles.append((page_num, i, end, title))
+        
+        for k, (page_num, _, title_end, title) in enumerate(potential_titles):
+            if k < len(potential_titles) - 1:
+                end_page, end_line, _, _ = potential_titles[k+1]
+            else:
+                end_page, end_line = page_num, len(page_lines[page_num])
             
-            doc.close()
-            
-        except Exception as e:
-            print(f"Error processing {pdf_path}: {e}")
+            content = []
+            for p in range(page_num, end_page + 1):
+                start = title_end + 1 if p == page_num else 0
+                stop = end_line if p == end_page else len(page_lines[p])
+                content.extend(line[0] for line in page_lines[p][start:stop] if line[0])
             
+            if content:
+                content_text = " ".join(content)
+                sections.append({
+                    "title": title,
+                    "content": content_text,
+                    "word_count": len(content_text.split()),
+                    "page_number": page_num + 1
+                })
+        
         return sections
     
     def extract_keywords(self, text):
@@ -114,56 +208,64 @@ class DocumentAnalyst:
             text (str): Text to analyze
             
         Returns:
-            list: List of keywords with their frequency
+            Counter: Frequency of each keyword
         """
-        words = re.findall(r'\b\w+\b', text.lower())
-        
-        words = [word for word in words if word not in self.stopwords and len(word) > 2]
-        
-        word_counts = Counter(words)
-        
-        return word_counts.most_common(20)
+        return Counter(word for word in _WORD_RE.findall(text.lower())
+                       if len(word) > 2 and word not in self.stopwords)
     
-    def calculate_relevance(self, section, persona, job):
+    def calculate_relevance(self, sections, query_keywords):
         """
-        Calculate section relevance using keyword matching and content analysis.
+        Calculate relevance of all sections at once using a bag-of-words matrix.
         
         Args:
-            section (dict): Section information including title and content
-            persona (str): Persona description
-            job (str): Job to be done
+            sections (list): Section dictionaries including title, content and word count
+            query_keywords (dict): Keyword frequencies of the persona and job query
             
         Returns:
-            float: Relevance score
+            numpy.ndarray: Relevance score per section
         """
-        title = section["title"]
-        content = section["content"]
-        
-        query = f"{persona} {job}"
-        query_keywords = dict(self.extract_keywords(query))
+        if not sections:
+            return np.zeros(0)
         
-        title_keywords = dict(self.extract_keywords(title))
-        content_keywords = dict(self.extract_keywords(content))
+        titles = [section["title"] for section in sections]
+        contents = [section["content"] for section in sections]
         
-        title_overlap = sum(title_keywords.get(word, 0) for word in query_keywords)
-        content_overlap = sum(min(content_keywords.get(word, 0), 5) for word in query_keywords)
+        word_counts = np.array([section["word_count"] for section in sections], dtype=float)
+        content_length = np.minimum(word_counts, 1000) / 1000.0
         
-        content_length = min(len(content.split()), 1000) / 1000.0
-        
-        unique_words = len(set(word for word in re.findall(r'\b\w+\b', content.lower()) 
-                              if word not in self.stopwords and len(word) > 3))
-        content_diversity = min(unique_words, 200) / 200.0
-        
-        relevance_score = (
+        vectorizer = CountVectorizer(token_pattern=r'\b\w{3,}\b')
+        try:
+            matrix = vectorizer.fit_transform(titles + contents).tocsr()
+        except ValueError:
+            # No section contains a word of three or more characters, so only length can score
+            return np.minimum((content_length * 1.0) / 20.0, 1.0)
+        title_matrix = matrix[:len(sections)]
+        content_matrix = matrix[len(sections):]
+        
+        query_vector = np.zeros(len(vectorizer.vocabulary_))
+        for word in query_keywords:
+            if word in vectorizer.vocabulary_:
+                query_vector[vectorizer.vocabulary_[word]] = 1.0
+        
+        diversity_columns = [index for word, index in vectorizer.vocabulary_.items()
+                             if len(word) > 3 and word not in self.stopwords]
+        unique_words = np.diff(content_matrix[:, diversity_columns].indptr)
+        content_diversity = np.minimum(unique_words, 200) / 200.0
+        
+        title_overlap = title_matrix @ query_vector
+        content_matrix.data = np.minimum(content_matrix.data, 5)
+        content_overlap = content_matrix @ query_vector
+        
+        relevance_scores = (
             (title_overlap * 3.0) +
             (content_overlap * 1.5) +
             (content_length * 1.0) +
             (content_diversity * 1.0)
         )
         
-        normalized_score = min(relevance_score / 20.0, 1.0)
+        normalized_scores = np.minimum(relevance_scores / 20.0, 1.0)
         
-        return normalized_score
+        return normalized_scores
     
     def extract_subsections(self, section_text):
         """
@@ -175,15 +277,19 @@ class DocumentAnalyst:
         Returns:
             str: Refined text with key subsections
         """
-        sentences = sent_tokenize(section_text)
+        sentences = _SENT_RE.split(section_text)
         
         if len(sentences) <= 5:
             return section_text
         
+        # Scoring only drops a few sentences from short sections, keep the opening ones instead
+        if len(sentences) <= 8:
+            return " ".join(sentences[:5])
+        
         scored_sentences = []
         for i, sentence in enumerate(sentences):
-            keywords = dict(self.extract_keywords(sentence))
-            keyword_count = sum(keywords.values())
+            keyword_count = sum(1 for word in _WORD_RE.findall(sentence.lower())
+                                if len(word) > 2 and word not in self.stopwords)
             
             position_score = 0
             if i < 3:
@@ -195,20 +301,16 @@ class DocumentAnalyst:
             length_score = min(words / 20.0, 1.0) if words < 50 else 2.0 - (words / 50.0)
             length_score = max(0.0, min(length_score, 1.0))
             
-            info_indicators = ['important', 'key', 'significant', 'essential', 'must', 'should', 
-                               'recommend', 'popular', 'best', 'top', 'famous']
-            indicator_score = 0.5 if any(indicator in sentence.lower() for indicator in info_indicators) else 0
+            indicator_score = 0.5 if _INFO_RE.search(sentence) else 0
             
             final_score = (keyword_count * 0.4) + (position_score * 0.3) + (length_score * 0.2) + (indicator_score * 0.1)
             
-            scored_sentences.append((sentence, final_score))
+            scored_sentences.append((i, final_score))
         
         sorted_sentences = sorted(scored_sentences, key=lambda x: x[1], reverse=True)
-        top_sentences = [s[0] for s in sorted_sentences[:5]]
+        top_indices = sorted(s[0] for s in sorted_sentences[:5])
         
-        ordered_top_sentences = [s for s in sentences if s in top_sentences]
-        
-        return " ".join(ordered_top_sentences)
+        return " ".join(sentences[i] for i in top_indices)
     
     def analyze_documents(self, input_data):
         """
@@ -240,8 +342,7 @@ class DocumentAnalyst:
             "subsection_analysis": []
         }
         
-        all_sections = []
-        
+        page_counts = []
         for doc in documents:
             filename = doc.get("filename", "")
             pdf_path = os.path.join("PDFs", filename)
@@ -250,12 +351,53 @@ class DocumentAnalyst:
                 continue
                 
             print(f"Processing document: {pdf_path}")
-            sections = self.extract_sections_from_pdf(pdf_path)
-            
-            for section in sections:
+            try:
+                with fitz.open(pdf_path, filetype="pdf") as pdf:
+                    page_counts.append((filename, pdf_path, len(pdf)))
+            except Exception as e:
+                print(f"Error processing {pdf_path}: {e}")
+        
+        chunks = [(doc_idx, start, min(start + _PAGE_CHUNK_SIZE, page_count))
+                  for doc_idx, (_, _, page_count) in enumerate(page_counts)
+                  for start in range(0, page_count, _PAGE_CHUNK_SIZE)]
+        all_sections = []
+        query_keywords = self.extract_keywords(f"{persona} {job}")
+        
+        if len(chunks) == 1:
+            # A single chunk is not worth starting worker processes that each import numpy and sklearn
+            filename, pdf_path, _ = page_counts[chunks[0][0]]
+            for section in self.extract_sections_from_pdf(pdf_path):
                 section["document"] = filename
-                section["relevance"] = self.calculate_relevance(section, persona, job)
                 all_sections.append(section)
+        elif chunks:
+            page_lines = [[] for _ in page_counts]
+            failed = set()
+            
+            max_workers = min(os.cpu_count() or 1, len(chunks))
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    (doc_idx, executor.submit(_extract_page_lines, page_counts[doc_idx][1], start, stop))
+                    for doc_idx, start, stop in chunks
+                ]
+                for doc_idx, future in futures:
+                    try:
+                        page_lines[doc_idx].extend(future.result())
+                    except Exception as e:
+                        if doc_idx not in failed:
+                            print(f"Error processing {page_counts[doc_idx][1]}: {e}")
+                        failed.add(doc_idx)
+            
+            for doc_idx, (filename, _, _) in enumerate(page_counts):
+                if doc_idx in failed:
+                    continue
+                
+                for section in self.extract_sections_from_lines(page_lines[doc_idx]):
+                    section["document"] = filename
+                    all_sections.append(section)
+        
+        relevance_scores = self.calculate_relevance(all_sections, query_keywords)
+        for section, score in zip(all_sections, relevance_scores):
+            section["relevance"] = float(score)
         
         all_sections.sort(key=lambda x: x["relevance"], reverse=True)
         top_sections = all_sections[:5]
@@ -297,8 +439,12 @@ def main():
     output = analyzer.analyze_documents(input_data)
     
     try:
-        with open(args.output_file, 'w') as f:
-            json.dump(output, f, indent=4)
+        if orjson is not None:
+            with open(args.output_file, 'wb') as f:
+                f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+        else:
+            with open(args.output_file, 'w', encoding='utf-8') as f:
+                json.dump(output, f, indent=2, ensure_ascii=False)
         print(f"Output saved to {args.output_file}")
     except Exception as e:
         print(f"Error saving output file: {e}")